@@ -29,11 +29,15 @@ Manual reminder endpoint (GET) available at /send-reminders
 Note: this is a single-file demo app designed for local use and experimentation. It is intentionally lightweight and avoids external dependencies beyond Flask.
 \"\"\"
 
-from flask import Flask, request, redirect, url_for, render_template_string, flash, send_file
+from flask import Flask, request, redirect, url_for, render_template, flash, g, Response, stream_with_context
 import sqlite3
 from contextlib import closing
-from datetime import datetime, date
+from datetime import date, datetime, timedelta
+from collections import Counter, defaultdict
+from functools import lru_cache
+import hashlib
 import os
+import re
 import smtplib
 from email.message import EmailMessage
 import argparse
@@ -51,17 +55,87 @@ DB_PATH = os.environ.get('FOOD_SAVER_DB') or os.path.join(base_dir, 'food_saver.
 app = Flask(__name__)
 app.secret_key = os.environ.get('FOOD_SAVER_SECRET', 'dev-secret')
 
+# Static files are versioned by a hash of their contents: url_for('static', ...) appends
+# ?v=<hash>, and only requests carrying the file's current hash are marked immutable for
+# a year. Unversioned or outdated URLs get Flask's normal caching. Hashes are cached per
+# file together with its mtime, so editing a file while the app runs (the debug reloader
+# only watches .py files) produces a new version instead of new bytes under the old one.
+_STATIC_VERSIONS = {}
+
+def static_version(filename):
+    path = os.path.join(app.static_folder, filename)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    cached = _STATIC_VERSIONS.get(filename)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    try:
+        with open(path, 'rb') as f:
+            v = hashlib.md5(f.read(), usedforsecurity=False).hexdigest()[:8]
+    except OSError:
+        return None
+    _STATIC_VERSIONS[filename] = (mtime, v)
+    return v
+
+@app.url_defaults
+def add_static_version(endpoint, values):
+    if endpoint == 'static' and 'v' not in values:
+        v = static_version(values['filename'])
+        if v:
+            values['v'] = v
+
+@app.after_request
+def add_static_cache_headers(response):
+    if request.endpoint == 'static' and response.status_code == 200:
+        v = request.args.get('v')
+        if v and v == static_version(request.view_args['filename']):
+            response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
 # -----------------------
 # Database helpers
 # -----------------------
 
+# journal_mode=WAL is persisted in the database file, so it only needs to be set
+# once per DB path; the other PRAGMAs are per-connection settings.
+_WAL_ENABLED_FOR = None
+
 def get_db_connection():
+    global _WAL_ENABLED_FOR
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
+    if _WAL_ENABLED_FOR != DB_PATH:
+        conn.execute('PRAGMA journal_mode=WAL')
+        _WAL_ENABLED_FOR = DB_PATH
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute('PRAGMA mmap_size=268435456')
     return conn
 
-def init_db(seed=False):
-    with closing(get_db_connection()) as db:
+def get_db():
+    # one connection per app context, closed again by close_db() on teardown
+    if 'db' not in g:
+        g.db = get_db_connection()
+        if DB_PATH not in _SCHEMA_READY_FOR:
+            ensure_schema(g.db)
+    return g.db
+
+@app.teardown_appcontext
+def close_db(exc=None):
+    db = g.pop('db', None)
+    if db is not None:
+        db.close()
+
+# DB paths whose schema has been ensured by this process. get_db() creates the schema
+# lazily for whichever DB_PATH is actually served (flask run / WSGI never call init_db),
+# so importing the module does not touch the default database file.
+_SCHEMA_READY_FOR = set()
+
+def ensure_schema(db):
+    # idempotent; db is an open connection (for ':memory:' it must be the one used afterwards)
+    with db:
         c = db.cursor()
         c.execute('''
             CREATE TABLE IF NOT EXISTS items (
@@ -81,47 +155,102 @@ def init_db(seed=False):
                 instructions TEXT
             )
         ''')
-        db.commit()
+        # covers every column the listing and reminder queries read, so they are answered from
+        # the index alone; it supersedes the plain idx_items_expiry from older databases
+        c.execute('DROP INDEX IF EXISTS idx_items_expiry')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_items_expiry_covering ON items(expiry_date, id, name, qty, purchase_date, notes)')
+        if c.execute('PRAGMA user_version').fetchone()[0] < 2:
+            _normalize_item_dates(c)
+            c.execute('PRAGMA user_version = 2')
+    if DB_PATH != ':memory:':
+        _SCHEMA_READY_FOR.add(DB_PATH)
+
+def _normalize_item_dates(c):
+    # One-time migration (tracked via PRAGMA user_version). The expiry listing and the
+    # reminder range query compare dates as strings, which only works for zero-padded
+    # YYYY-MM-DD. Older versions stored whatever strptime('%Y-%m-%d') accepted on add
+    # (e.g. 2026-9-1) and did not validate edits at all. The DATE columns have NUMERIC
+    # affinity, so a compact 20250901 (accepted by date.fromisoformat for a while) was
+    # stored as an INTEGER. Rewrite what parses as a padded ISO string and leave anything
+    # else untouched (it is listed with an unknown expiry).
+    for col in ('purchase_date', 'expiry_date'):
+        rows = c.execute(f'''
+            SELECT id, CAST({col} AS TEXT) FROM items
+            WHERE {col} IS NOT NULL AND {col} != ''
+              AND (typeof({col}) != 'text'
+                   OR {col} NOT GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]')
+        ''').fetchall()
+        for rid, value in rows:
+            fixed = None
+            for fmt in ('%Y-%m-%d', '%Y%m%d'):
+                try:
+                    fixed = datetime.strptime(value, fmt).date().isoformat()
+                    break
+                except (ValueError, TypeError):
+                    pass
+            if fixed:
+                c.execute(f'UPDATE items SET {col}=? WHERE id=?', (fixed, rid))
+
+def seed_sample_data(db):
+    # db: an open connection whose schema already exists (see ensure_schema)
+    # sample items
+    sample_items = [
+        ('Milk', '1 L', '2025-08-25', '2025-09-02', '2% lactose-free'),
+        ('Eggs', '12', '2025-08-20', '2025-09-03', 'Large'),
+        ('Spinach', '1 bag', '2025-08-28', '2025-09-01', 'Baby spinach'),
+        ('Tomato', '3', '2025-08-27', '2025-09-05', ''),
+        ('Cheddar cheese', '200 g', '2025-07-20', '2025-10-01', ''),
+        ('Bread', '1 loaf', '2025-08-29', '2025-09-01', '')
+    ]
+    # sample recipes (very simple)
+    sample_recipes = [
+        ('Cheesy Scrambled Eggs', 'eggs,cheddar cheese,butter,salt,pepper', 'Beat eggs, melt butter, cook gently, add cheese.'),
+        ('Tomato Spinach Salad', 'tomato,spinach,olive oil,salt,pepper', 'Toss chopped tomato with spinach and dressing.'),
+        ('French Toast', 'bread,eggs,milk,cinnamon,butter', 'Dip bread in egg-milk mix and fry.'),
+    ]
+    # `with db` commits items and recipes as one transaction (rolled back on error)
+    with db:
+        db.executemany('INSERT INTO items (name, qty, purchase_date, expiry_date, notes) VALUES (?, ?, ?, ?, ?)', sample_items)
+        db.executemany('INSERT INTO recipes (name, ingredients, instructions) VALUES (?, ?, ?)', sample_recipes)
+    _invalidate_recipe_cache()
 
+def init_db(seed=False):
+    # one connection for both steps, so this also works for ':memory:'
+    with closing(get_db_connection()) as db:
+        ensure_schema(db)
         if seed:
-            # sample items
-            sample_items = [
-                ('Milk', '1 L', '2025-08-25', '2025-09-02', '2% lactose-free'),
-                ('Eggs', '12', '2025-08-20', '2025-09-03', 'Large'),
-                ('Spinach', '1 bag', '2025-08-28', '2025-09-01', 'Baby spinach'),
-                ('Tomato', '3', '2025-08-27', '2025-09-05', ''),
-                ('Cheddar cheese', '200 g', '2025-07-20', '2025-10-01', ''),
-                ('Bread', '1 loaf', '2025-08-29', '2025-09-01', '')
-            ]
-            for it in sample_items:
-                c.execute('INSERT INTO items (name, qty, purchase_date, expiry_date, notes) VALUES (?, ?, ?, ?, ?)', it)
-
-            # sample recipes (very simple)
-            sample_recipes = [
-                ('Cheesy Scrambled Eggs', 'eggs,cheddar cheese,butter,salt,pepper', 'Beat eggs, melt butter, cook gently, add cheese.'),
-                ('Tomato Spinach Salad', 'tomato,spinach,olive oil,salt,pepper', 'Toss chopped tomato with spinach and dressing.'),
-                ('French Toast', 'bread,eggs,milk,cinnamon,butter', 'Dip bread in egg-milk mix and fry.'),
-            ]
-            for r in sample_recipes:
-                c.execute('INSERT INTO recipes (name, ingredients, instructions) VALUES (?, ?, ?)', r)
-            db.commit()
+            seed_sample_data(db)
 
 # -----------------------
 # Utility functions
 # -----------------------
 
+# expiry/purchase dates repeat heavily across rows and requests; date objects are
+# immutable, so caching the parsed result is safe
+@lru_cache(maxsize=2048)
 def parse_date(s):
     if not s:
         return None
     try:
-        return datetime.strptime(s, '%Y-%m-%d').date()
-    except ValueError:
+        return date.fromisoformat(s)
+    except (ValueError, TypeError):
         return None
 
-def days_until(d):
+# Shape of the value an <input type="date"> submits. Checked before parse_date() so
+# that other ISO 8601 spellings date.fromisoformat() would accept (e.g. 20250901)
+# are rejected: stored dates must stay YYYY-MM-DD for the SQL range/sort queries.
+_DATE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+def is_valid_date(s):
+    # parse_date() is memoized, so this also warms the cache for the next index() render
+    return bool(_DATE_RE.match(s)) and parse_date(s) is not None
+
+def days_until(d, today=None):
+    # callers looping over many rows should pass `today` in rather than re-reading the clock per row
     if not d:
         return None
-    today = date.today()
+    if today is None:
+        today = date.today()
     return (d - today).days
 
 def categorize(days):
@@ -135,36 +264,91 @@ def categorize(days):
         return 'soon'
     return 'later'
 
+def days_and_categories(expiry_dates, today):
+    # expiry_dates: list of raw 'YYYY-MM-DD' strings (or None/'')
+    # returns parallel lists of days-until-expiry (None if unknown) and categorize() labels.
+    # A plain loop on purpose: parse_date() is lru_cached and pantries repeat dates, so this
+    # measured as fast as or faster than NumPy datetime64 vectorization at 10-10k rows.
+    days = []
+    for s in expiry_dates:
+        ed = parse_date(s) if s else None
+        days.append(days_until(ed, today) if ed else None)
+    return days, [categorize(d) for d in days]
+
 # -----------------------
 # Recipe matching
 # -----------------------
 
 def load_recipes():
-    conn = get_db_connection()
-    cur = conn.cursor()
+    db = get_db()
+    cur = db.cursor()
     cur.execute('SELECT id, name, ingredients, instructions FROM recipes')
     rows = cur.fetchall()
-    conn.close()
     recipes = []
     for r in rows:
         ingredients = [x.strip().lower() for x in r['ingredients'].split(',') if x.strip()]
         recipes.append({'id': r['id'], 'name': r['name'], 'ingredients': ingredients, 'instructions': r['instructions']})
     return recipes
 
-def match_recipes(available_items):
-    # available_items: list of ingredient names (lowercased)
-    recipes = load_recipes()
+# Parsed recipes are cached in-process; recipes only change through the
+# add/delete/seed paths, which call _invalidate_recipe_cache().
+# `data` holds the recipes by id, an inverted index ingredient -> [recipe id, ...]
+# and the number of distinct ingredients each recipe needs. It is built as one
+# dict and swapped in whole, so readers never see a half-built cache.
+# `version` is bumped on every invalidation; a build only stores its result if no
+# invalidation happened while it was reading, otherwise a request that loaded
+# recipes just before a concurrent add/delete could pin the stale list.
+_RECIPE_CACHE = {'version': 0, 'data': None}
+_RECIPE_CACHE_LOCK = threading.Lock()
+
+def _recipes_cached():
+    data = _RECIPE_CACHE['data']
+    if data is None:
+        version = _RECIPE_CACHE['version']
+        by_id = {}
+        inverted = defaultdict(list)
+        req_len = {}
+        for rec in load_recipes():
+            rec['ingredients_set'] = frozenset(rec['ingredients'])
+            by_id[rec['id']] = rec
+            req_len[rec['id']] = len(rec['ingredients_set'])
+            for ing in rec['ingredients_set']:
+                inverted[ing].append(rec['id'])
+        data = {'by_id': by_id, 'inverted': dict(inverted), 'req_len': req_len}
+        with _RECIPE_CACHE_LOCK:
+            if _RECIPE_CACHE['version'] == version:
+                _RECIPE_CACHE['data'] = data
+    return data
+
+def _invalidate_recipe_cache():
+    with _RECIPE_CACHE_LOCK:
+        _RECIPE_CACHE['version'] += 1
+        _RECIPE_CACHE['data'] = None
+
+def match_recipes(aval_set):
+    # aval_set: set of available ingredient names (already lowercased)
+    cache = _recipes_cached()
+    inverted, req_len = cache['inverted'], cache['req_len']
+    # Prefilter: only ingredients some recipe actually uses can contribute. The set
+    # intersection runs in C over the smaller side, so a large pantry with few recipe
+    # ingredients (or vice versa) does not cost a Python-level probe per item.
+    shared = aval_set & inverted.keys()
+    if not shared:
+        return []
+    # count matched ingredients per candidate recipe via the inverted index; recipes
+    # sharing nothing with the pantry never enter `hits` and are never scored
+    hits = Counter()
+    for ing in shared:
+        hits.update(inverted[ing])
     matches = []
-    aval_set = set([i.lower() for i in available_items])
-    for rec in recipes:
-        req = set(rec['ingredients'])
-        matched = req & aval_set
+    for rid, h in hits.items():
         # score = matched / required
-        score = len(matched) / max(1, len(req))
+        score = h / req_len[rid]
         if score >= 0.5:  # threshold: at least half the ingredients
-            matches.append((score, rec))
-    matches.sort(key=lambda x: x[0], reverse=True)
-    return [r for s, r in matches]
+            matches.append((score, rid))
+    # best score first, ties in recipe id order
+    matches.sort(key=lambda x: (-x[0], x[1]))
+    return [cache['by_id'][rid] for s, rid in matches]
 
 # -----------------------
 # Routes / Views
@@ -173,21 +357,7 @@ def match_recipes(available_items):
 INDEX_HTML = '''
 <!doctype html>
 <title>FoodSaver — Pantry</title>
-<style>
-body{font-family:system-ui,Segoe UI,Roboto,Arial;margin:20px}
-.card{border-radius:8px;padding:12px;margin-bottom:12px;box-shadow:0 1px 3px rgba(0,0,0,0.08)}
-.grid{display:flex;gap:12px}
-.left{flex:2}
-.right{flex:1}
-.badge{display:inline-block;padding:4px 8px;border-radius:999px;font-size:0.9em}
-.badge.expired{background:#ffd6d6}
-.badge.urgent{background:#ffecc2}
-.badge.soon{background:#fff4d6}
-.badge.later{background:#e6fff0}
-.item-row{display:flex;justify-content:space-between;align-items:center;padding:8px;border-bottom:1px solid #eee}
-.small{font-size:0.9em;color:#555}
-.form-row{margin-bottom:8px}
-</style>
+<link rel="stylesheet" href="{{ url_for('static', filename='app.css') }}">
 <h1>FoodSaver — Pantry</h1>
 <p class="small">Local-only demo. Add items with expiry dates and find recipes that use things you already have.</p>
 <div class="grid">
@@ -250,27 +420,39 @@ body{font-family:system-ui,Segoe UI,Roboto,Arial;margin:20px}
   </div>
 </div>
 '''
+# Compile the page templates once at import; render_template() accepts a
+# Template object and still applies Flask's context processors.
+INDEX_TEMPLATE = app.jinja_env.from_string(INDEX_HTML)
 
 @app.route('/')
 def index():
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute('SELECT id, name, qty, purchase_date, expiry_date, notes FROM items')
+    db = get_db()
+    cur = db.cursor()
+    # Two range scans over idx_items_expiry_covering rather than one ORDER BY on an expression,
+    # which would force a full scan plus a temp sort. Items without a usable expiry date go to
+    # the end: NULL, blank from the form, or non-text values (NUMERIC affinity can store a
+    # legacy 20250901 as an INTEGER, which sorts before any text and so fails > '').
+    # `<= ''` is exactly NOT (> '') for non-NULL values and, unlike NOT, can use the index.
+    cur.execute('''
+        SELECT id, name, qty, purchase_date, expiry_date, notes FROM items
+        WHERE expiry_date > '' ORDER BY expiry_date
+    ''')
     rows = cur.fetchall()
-    conn.close()
+    cur.execute('''
+        SELECT id, name, qty, purchase_date, expiry_date, notes FROM items
+        WHERE expiry_date IS NULL OR expiry_date <= ''
+    ''')
+    rows += cur.fetchall()
+    today = date.today()
     items = []
-    available_names = []
-    for r in rows:
-        ed = parse_date(r['expiry_date']) if r['expiry_date'] else None
-        d = days_until(ed) if ed else None
-        cat = categorize(d)
+    available_set = set()
+    all_days, all_cats = days_and_categories([r['expiry_date'] for r in rows], today)
+    for r, d, cat in zip(rows, all_days, all_cats):
         itm = {'id': r['id'], 'name': r['name'], 'qty': r['qty'], 'purchase_date': r['purchase_date'], 'expiry_date': r['expiry_date'], 'notes': r['notes'], 'days': d if d is not None else '—', 'category': cat}
         items.append(itm)
-        available_names.append(r['name'].lower())
-    # sort by days (None/— goes to end)
-    items.sort(key=lambda x: (9999 if x['days']=='—' else x['days']))
-    recipes = match_recipes(available_names)
-    return render_template_string(INDEX_HTML, items=items, recipes=recipes)
+        available_set.add(r['name'].lower())
+    recipes = match_recipes(available_set)
+    return render_template(INDEX_TEMPLATE, items=items, recipes=recipes)
 
 # -----------------------
 # CRUD for items
@@ -287,17 +469,16 @@ def add_item():
         flash('Name required')
         return redirect(url_for('index'))
     # validate dates
-    if purchase_date and not parse_date(purchase_date):
+    if purchase_date and not is_valid_date(purchase_date):
         flash('Invalid purchase date format; use YYYY-MM-DD')
         return redirect(url_for('index'))
-    if expiry_date and not parse_date(expiry_date):
+    if expiry_date and not is_valid_date(expiry_date):
         flash('Invalid expiry date format; use YYYY-MM-DD')
         return redirect(url_for('index'))
-    conn = get_db_connection()
-    cur = conn.cursor()
+    db = get_db()
+    cur = db.cursor()
     cur.execute('INSERT INTO items (name, qty, purchase_date, expiry_date, notes) VALUES (?, ?, ?, ?, ?)', (name, qty, purchase_date, expiry_date, notes))
-    conn.commit()
-    conn.close()
+    db.commit()
     flash('Item added')
     return redirect(url_for('index'))
 
@@ -314,15 +495,15 @@ EDIT_HTML = '''
   <div><button>Save</button> <a href="/">Cancel</a></div>
 </form>
 '''
+EDIT_TEMPLATE = app.jinja_env.from_string(EDIT_HTML)
 
 @app.route('/edit/<int:item_id>', methods=['GET', 'POST'])
 def edit_item(item_id):
-    conn = get_db_connection()
-    cur = conn.cursor()
+    db = get_db()
+    cur = db.cursor()
     cur.execute('SELECT id, name, qty, purchase_date, expiry_date, notes FROM items WHERE id=?', (item_id,))
     row = cur.fetchone()
     if not row:
-        conn.close()
         flash('Item not found')
         return redirect(url_for('index'))
     if request.method == 'POST':
@@ -331,22 +512,24 @@ def edit_item(item_id):
         purchase_date = request.form.get('purchase_date')
         expiry_date = request.form.get('expiry_date')
         notes = request.form.get('notes') or ''
+        if purchase_date and not is_valid_date(purchase_date):
+            flash('Invalid purchase date format; use YYYY-MM-DD')
+            return redirect(url_for('edit_item', item_id=item_id))
+        if expiry_date and not is_valid_date(expiry_date):
+            flash('Invalid expiry date format; use YYYY-MM-DD')
+            return redirect(url_for('edit_item', item_id=item_id))
         cur.execute('UPDATE items SET name=?, qty=?, purchase_date=?, expiry_date=?, notes=? WHERE id=?', (name, qty, purchase_date, expiry_date, notes, item_id))
-        conn.commit()
-        conn.close()
+        db.commit()
         flash('Saved')
         return redirect(url_for('index'))
-    item = dict(row)
-    conn.close()
-    return render_template_string(EDIT_HTML, item=item)
+    return render_template(EDIT_TEMPLATE, item=row)
 
 @app.route('/delete/<int:item_id>')
 def delete_item(item_id):
-    conn = get_db_connection()
-    cur = conn.cursor()
+    db = get_db()
+    cur = db.cursor()
     cur.execute('DELETE FROM items WHERE id=?', (item_id,))
-    conn.commit()
-    conn.close()
+    db.commit()
     flash('Deleted')
     return redirect(url_for('index'))
 
@@ -378,37 +561,36 @@ RECIPES_HTML = '''
   <p>No recipes yet.</p>
 {% endfor %}
 '''
+RECIPES_TEMPLATE = app.jinja_env.from_string(RECIPES_HTML)
 
 @app.route('/recipes')
 def recipes_page():
-    conn = get_db_connection()
-    cur = conn.cursor()
+    db = get_db()
+    cur = db.cursor()
     cur.execute('SELECT id, name, ingredients, instructions FROM recipes')
-    rows = cur.fetchall()
-    conn.close()
-    recs = [dict(r) for r in rows]
-    return render_template_string(RECIPES_HTML, recipes=recs)
+    # sqlite3.Row supports r['name'] in Jinja, so rows are rendered straight off the cursor
+    return render_template(RECIPES_TEMPLATE, recipes=cur)
 
 @app.route('/recipes/add', methods=['POST'])
 def recipes_add():
     name = request.form.get('name')
     ingredients = request.form.get('ingredients')
     instructions = request.form.get('instructions')
-    conn = get_db_connection()
-    cur = conn.cursor()
+    db = get_db()
+    cur = db.cursor()
     cur.execute('INSERT INTO recipes (name, ingredients, instructions) VALUES (?, ?, ?)', (name, ingredients, instructions))
-    conn.commit()
-    conn.close()
+    db.commit()
+    _invalidate_recipe_cache()
     flash('Recipe added')
     return redirect(url_for('recipes_page'))
 
 @app.route('/recipes/delete/<int:rid>')
 def recipes_delete(rid):
-    conn = get_db_connection()
-    cur = conn.cursor()
+    db = get_db()
+    cur = db.cursor()
     cur.execute('DELETE FROM recipes WHERE id=?', (rid,))
-    conn.commit()
-    conn.close()
+    db.commit()
+    _invalidate_recipe_cache()
     flash('Recipe deleted')
     return redirect(url_for('recipes_page'))
 
@@ -416,24 +598,23 @@ def recipes_delete(rid):
 # Export
 # -----------------------
 
+class _Echo:
+    # file-like object for csv.writer: writerow() returns the formatted line instead of buffering it
+    def write(self, value):
+        return value
+
 @app.route('/export')
 def export_csv():
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute('SELECT id, name, qty, purchase_date, expiry_date, notes FROM items')
-    rows = cur.fetchall()
-    conn.close()
     import csv
-    from io import StringIO, BytesIO
-    si = StringIO()
-    cw = csv.writer(si)
-    cw.writerow(['id', 'name', 'qty', 'purchase_date', 'expiry_date', 'notes'])
-    for r in rows:
-        cw.writerow([r['id'], r['name'], r['qty'], r['purchase_date'], r['expiry_date'], r['notes']])
-    mem = BytesIO()
-    mem.write(si.getvalue().encode('utf-8'))
-    mem.seek(0)
-    return send_file(mem, mimetype='text/csv', as_attachment=True, download_name='food_saver_export.csv')
+    def generate():
+        cw = csv.writer(_Echo())
+        yield cw.writerow(['id', 'name', 'qty', 'purchase_date', 'expiry_date', 'notes'])
+        cur = get_db().execute('SELECT id, name, qty, purchase_date, expiry_date, notes FROM items')
+        for r in cur:
+            yield cw.writerow([r['id'], r['name'], r['qty'], r['purchase_date'], r['expiry_date'], r['notes']])
+    # stream_with_context keeps the request (and its g.db connection) alive while the body is sent
+    return Response(stream_with_context(generate()), mimetype='text/csv',
+                    headers={'Content-Disposition': 'attachment; filename=food_saver_export.csv'})
 
 # -----------------------
 # Seed sample data
@@ -441,7 +622,7 @@ def export_csv():
 
 @app.route('/seed', methods=['POST'])
 def seed():
-    init_db(seed=True)
+    seed_sample_data(get_db())
     flash('Seeded sample data')
     return redirect(url_for('index'))
 
@@ -449,21 +630,37 @@ def seed():
 # Reminders (manual trigger)
 # -----------------------
 
+# ISO dates compare correctly as strings, so this range check can use idx_items_expiry_covering.
+# `> ''` excludes NULL, blank and non-text values (which would otherwise sort below any date).
+_EXPIRING_WHERE = "expiry_date > '' AND expiry_date <= ?"
+
+def _expiry_threshold(days_threshold, today):
+    return (today + timedelta(days=days_threshold)).isoformat()
+
+def count_items_expiring_within(days_threshold=3):
+    threshold = _expiry_threshold(days_threshold, date.today())
+    return get_db().execute(f'SELECT COUNT(*) FROM items WHERE {_EXPIRING_WHERE}', (threshold,)).fetchone()[0]
+
 def get_items_expiring_within(days_threshold=3):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute('SELECT id, name, qty, purchase_date, expiry_date, notes FROM items')
+    db = get_db()
+    cur = db.cursor()
+    today = date.today()
+    threshold = _expiry_threshold(days_threshold, today)
+    cur.execute(f'''
+        SELECT id, name, qty, purchase_date, expiry_date, notes FROM items
+        WHERE {_EXPIRING_WHERE}
+        ORDER BY expiry_date
+    ''', (threshold,))
     rows = cur.fetchall()
-    conn.close()
     urgent = []
     for r in rows:
         ed = parse_date(r['expiry_date']) if r['expiry_date'] else None
-        d = days_until(ed) if ed else None
+        d = days_until(ed, today) if ed else None
         if d is not None and d <= days_threshold:
             urgent.append({'id': r['id'], 'name': r['name'], 'qty': r['qty'], 'expiry_date': r['expiry_date'], 'days': d})
     return urgent
 
-def send_email(subject, body, to_addrs):
+def _email_settings(to_addrs):
     host = os.environ.get('EMAIL_SMTP_HOST')
     port = int(os.environ.get('EMAIL_SMTP_PORT', 587))
     user = os.environ.get('EMAIL_USERNAME')
@@ -471,16 +668,87 @@ def send_email(subject, body, to_addrs):
     from_addr = os.environ.get('EMAIL_FROM') or user
     if not host or not user or not pw or not to_addrs:
         raise RuntimeError('Missing email configuration')
+    return host, port, user, pw, from_addr
+
+def _build_email(subject, body, from_addr, to_addrs):
     msg = EmailMessage()
     msg['Subject'] = subject
     msg['From'] = from_addr
     msg['To'] = to_addrs
     msg.set_content(body)
-    with smtplib.SMTP(host, port) as s:
+    return msg
+
+# Socket timeout (seconds) for SMTP sessions, so a silently dropped connection fails
+# fast instead of blocking the caller until TCP gives up retransmitting.
+SMTP_TIMEOUT = 30
+# RFC 5321 lets servers drop idle sessions after 5 minutes, and many do it sooner.
+# The scheduler only keeps its session open between wake-ups shorter than this.
+SMTP_IDLE_KEEPALIVE = 5 * 60
+
+def send_email(subject, body, to_addrs):
+    # one-shot send (used by /send-reminders); the scheduler uses ReminderMailer instead
+    host, port, user, pw, from_addr = _email_settings(to_addrs)
+    msg = _build_email(subject, body, from_addr, to_addrs)
+    with smtplib.SMTP(host, port, timeout=SMTP_TIMEOUT) as s:
         s.starttls()
         s.login(user, pw)
         s.send_message(msg)
 
+class ReminderMailer:
+    # Keeps one authenticated SMTP session open across scheduler wake-ups so each
+    # reminder costs a NOOP + send instead of a fresh TCP/TLS/AUTH handshake.
+    # Reconnects when the server has dropped the session or the settings change.
+    # With keep_open=False the session is closed after every send; the scheduler uses
+    # that when its interval is longer than servers keep idle sessions around, where
+    # holding the socket would only mean a NOOP on a dead connection each wake-up.
+
+    def __init__(self, keep_open=True):
+        self.keep_open = keep_open
+        self.smtp = None
+        self.settings = None
+
+    def _ensure_connected(self, settings):
+        if self.smtp is not None and settings == self.settings:
+            try:
+                if self.smtp.noop()[0] == 250:
+                    return self.smtp
+            except (smtplib.SMTPException, OSError):
+                pass
+        self.close()
+        host, port, user, pw, _ = settings
+        s = smtplib.SMTP(host, port, timeout=SMTP_TIMEOUT)
+        try:
+            s.starttls()
+            s.login(user, pw)
+        except Exception:
+            s.close()
+            raise
+        self.smtp, self.settings = s, settings
+        return s
+
+    def send(self, subject, body, to_addrs):
+        settings = _email_settings(to_addrs)
+        msg = _build_email(subject, body, settings[4], to_addrs)
+        try:
+            self._ensure_connected(settings).send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # dropped between the NOOP and the send; retry once on a fresh session
+            self.close()
+            self._ensure_connected(settings).send_message(msg)
+        finally:
+            if not self.keep_open:
+                self.close()
+
+    def close(self):
+        if self.smtp is None:
+            return
+        try:
+            self.smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self.smtp.close()
+        self.smtp = None
+        self.settings = None
+
 @app.route('/send-reminders')
 def send_reminders():
     to = os.environ.get('EMAIL_TO')
@@ -512,21 +780,30 @@ def start_reminder_scheduler(interval_minutes=60):
     \"\"\"
     stop_event = threading.Event()
     def worker():
-        while not stop_event.wait(interval_minutes * 60):
-            try:
-                to = os.environ.get('EMAIL_TO')
-                if not to:
-                    # nothing configured; skip until environment is set
-                    continue
-                urgent = get_items_expiring_within(3)
-                if urgent:
-                    body_lines = ['Items expiring soon:']
-                    for u in urgent:
-                        body_lines.append(f"- {u['name']} (in {u['days']} days) — expiry {u['expiry_date']}")
-                    send_email('FoodSaver automatic reminders — items expiring soon', '\n'.join(body_lines), to)
-            except Exception as e:
-                # don't crash the thread; just log
-                print('Reminder scheduler error:', e)
+        mailer = ReminderMailer(keep_open=interval_minutes * 60 <= SMTP_IDLE_KEEPALIVE)
+        try:
+            while not stop_event.wait(interval_minutes * 60):
+                try:
+                    to = os.environ.get('EMAIL_TO')
+                    if not to:
+                        # nothing configured; skip until environment is set
+                        continue
+                    # get_db() needs an app context; it is torn down (and the connection closed) per wake-up
+                    with app.app_context():
+                        # one indexed COUNT per wake-up; only load and format rows when something is due
+                        if not count_items_expiring_within(3):
+                            continue
+                        urgent = get_items_expiring_within(3)
+                    if urgent:
+                        body_lines = ['Items expiring soon:']
+                        for u in urgent:
+                            body_lines.append(f"- {u['name']} (in {u['days']} days) — expiry {u['expiry_date']}")
+                        mailer.send('FoodSaver automatic reminders — items expiring soon', '\n'.join(body_lines), to)
+                except Exception as e:
+                    # don't crash the thread; just log
+                    print('Reminder scheduler error:', e)
+        finally:
+            mailer.close()
     t = threading.Thread(target=worker, daemon=True)
     t.start()
     return stop_event
@@ -534,28 +811,116 @@ def start_reminder_scheduler(interval_minutes=60):
 def run_tests_quick():
     # Basic sanity tests that exercise the code paths without a browser
     print('Running quick tests...')
-    # Create a fresh DB in-memory for testing
-    test_db = ':memory:'
+
+    # blank, malformed and non-text expiry values (legacy rows) are categorized as unknown
+    today = date(2025, 9, 1)
+    days, cats = days_and_categories(
+        ['2025-08-31', '2025-09-04', '2025-09-15', '2025-09-16', None, '', '2025-09', ' 2025-09-01', '2025-02-30', 20250901],
+        today)
+    assert days[:4] == [-1, 3, 14, 15], days
+    assert cats == ['expired', 'urgent', 'soon', 'later'] + ['unknown'] * 6, cats
+    print('Categorization OK')
+
+    # ReminderMailer: session reused across sends, reconnect after a failed NOOP,
+    # exactly one retry when the server disconnects during the send
+    global _email_settings
+    events = []
+    class FakeSMTP:
+        instances = []
+        def __init__(self, host, port, timeout=None):
+            self.noop_ok = True
+            self.disconnect_sends = 0
+            FakeSMTP.instances.append(self)
+            events.append('connect')
+        def starttls(self):
+            pass
+        def login(self, user, pw):
+            pass
+        def noop(self):
+            if not self.noop_ok:
+                raise smtplib.SMTPServerDisconnected('gone')
+            return (250, b'OK')
+        def send_message(self, msg):
+            if self.disconnect_sends:
+                self.disconnect_sends -= 1
+                events.append('dropped')
+                raise smtplib.SMTPServerDisconnected('gone')
+            events.append('send')
+        def quit(self):
+            events.append('quit')
+        def close(self):
+            pass
+    saved_smtp, saved_settings = smtplib.SMTP, _email_settings
+    smtplib.SMTP = FakeSMTP
+    _email_settings = lambda to_addrs: ('smtp.test', 587, 'user', 'pw', 'from@test')
+    try:
+        mailer = ReminderMailer()
+        mailer.send('s', 'b', 'to@test')
+        mailer.send('s', 'b', 'to@test')
+        assert events == ['connect', 'send', 'send'], events
+        events.clear()
+        FakeSMTP.instances[-1].noop_ok = False
+        mailer.send('s', 'b', 'to@test')
+        assert events == ['quit', 'connect', 'send'], events
+        events.clear()
+        FakeSMTP.instances[-1].disconnect_sends = 1
+        mailer.send('s', 'b', 'to@test')
+        assert events == ['dropped', 'quit', 'connect', 'send'], events
+        # a disconnect on the retry as well is raised, not retried again
+        events.clear()
+        FakeSMTP.instances[-1].disconnect_sends = 1
+        original_init = FakeSMTP.__init__
+        def init_dropping(self, *a, **k):
+            original_init(self, *a, **k)
+            self.disconnect_sends = 1
+        FakeSMTP.__init__ = init_dropping
+        try:
+            mailer.send('s', 'b', 'to@test')
+            raise AssertionError('expected SMTPServerDisconnected')
+        except smtplib.SMTPServerDisconnected:
+            pass
+        finally:
+            FakeSMTP.__init__ = original_init
+        assert events == ['dropped', 'quit', 'connect', 'dropped'], events
+        mailer.close()
+        # keep_open=False closes the session after each send
+        events.clear()
+        mailer = ReminderMailer(keep_open=False)
+        mailer.send('s', 'b', 'to@test')
+        mailer.send('s', 'b', 'to@test')
+        assert events == ['connect', 'send', 'quit', 'connect', 'send', 'quit'], events
+    finally:
+        smtplib.SMTP, _email_settings = saved_smtp, saved_settings
+    print('Reminder mailer OK')
+    # Create a fresh throwaway DB for testing. Not ':memory:': every connection to that
+    # gets its own empty database, and the checks below open several connections.
+    import tempfile
     global DB_PATH
     old_db = DB_PATH
-    DB_PATH = test_db
-    init_db(seed=True)
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute('SELECT COUNT(*) FROM items')
-    nitems = cur.fetchone()[0]
-    cur.execute('SELECT COUNT(*) FROM recipes')
-    nrec = cur.fetchone()[0]
-    assert nitems > 0, 'Seed items missing'
-    assert nrec > 0, 'Seed recipes missing'
-    print('Seed OK: items=', nitems, 'recipes=', nrec)
-
-    # test matching
-    items = ['eggs', 'cheddar cheese', 'bread']
-    matches = match_recipes(items)
-    assert any('Egg' in r['name'] or 'Eggs' in r['name'] for r in matches), 'Recipe matching failed'
-    print('Recipe matching OK')
-    DB_PATH = old_db
+    with tempfile.TemporaryDirectory() as tmp:
+        DB_PATH = os.path.join(tmp, 'test.db')
+        _invalidate_recipe_cache()
+        try:
+            init_db(seed=True)
+            with closing(get_db_connection()) as conn:
+                cur = conn.cursor()
+                cur.execute('SELECT COUNT(*) FROM items')
+                nitems = cur.fetchone()[0]
+                cur.execute('SELECT COUNT(*) FROM recipes')
+                nrec = cur.fetchone()[0]
+            assert nitems > 0, 'Seed items missing'
+            assert nrec > 0, 'Seed recipes missing'
+            print('Seed OK: items=', nitems, 'recipes=', nrec)
+
+            # test matching; the seed recipes need at least half their ingredients present
+            items = {'eggs', 'cheddar cheese', 'butter'}
+            with app.app_context():
+                matches = match_recipes(items)
+            assert any('Egg' in r['name'] or 'Eggs' in r['name'] for r in matches), 'Recipe matching failed'
+            print('Recipe matching OK')
+        finally:
+            DB_PATH = old_db
+            _invalidate_recipe_cache()
     print('Quick tests passed')
 
 if __name__ == '__main__':
@@ -594,7 +959,6 @@ if __name__ == '__main__':
             scheduler_stop = start_reminder_scheduler(args.reminder_interval)
 
     if not (args.init or args.seed or args.test):
-        init_db(seed=False)
         try:
             app.run(host=args.host, port=args.port, debug=True)
         finally: